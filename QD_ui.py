@@ -1,20 +1,26 @@
 import pyvisa
 import datetime
 import time
-import csv
+import struct
+import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 import tkinter as tk
 from tkinter import ttk, messagebox
 import threading
+import queue
 from typing import Iterable, List, Tuple, Union
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import TDK_PSU_Control as PSU
 import os
 
 # ---------------- Global Variables ---------------- #
-measurement_running = False
-times, currents, voltages = [], [], []
+stop_event = threading.Event()  # set when the measurement should stop
+stop_event.set()
+rm = None        # pyvisa.ResourceManager, created once on first connect
+psu = None       # PSU.PSU control connection of the current measurement
+ramprate = 0.0   # [A/s], snapshot of ramprate_var taken at start
+row_queue = queue.SimpleQueue()  # (t, a, v) rows from read_data to write_data
 start_time = time.time()
 
 Step = Tuple[float, float]   # (I_target [A], T_ramp [s])
@@ -22,6 +28,28 @@ PORT = 8003
 SOCKET_TIMEOUT = 5.0
 SSA_BIT = 6    # Sequencer Step Active
 TWI_BIT = 3    # Trigger Wait
+CSV_BATCH_ROWS = 256     # max rows per file.write() call in write_data
+CSV_QUEUE_TIMEOUT = 0.1  # s, write_data waits this long to fill a batch
+CSV_BUFFER_SIZE = 1 << 20  # bytes, file buffer instead of per-row flush
+CSV_ROW = b"%.6f,%.3f,%.9f\n"  # timestamp, current(A), voltage(V)
+VISA_CHUNK_SIZE = 1024 * 1024  # bytes per low-level VISA read
+DMM_BATCH = 20                 # readings per binary block from QD.tsp
+DMM_SAMPLE_PERIOD = 1 / 75     # s per reading at NPLC 0.5 in QD.tsp
+# ms; 10x the time for one block leaves room for a slower NPLC,
+# but a hung DMM still raises
+VISA_TIMEOUT = max(2000, round(10 * DMM_BATCH * DMM_SAMPLE_PERIOD * 1000))
+DMM_ROW = struct.Struct("<fff")  # time, current, voltage as REAL32
+PLOT_POINTS = 1000000          # size of the live plot ring buffer
+PLOT_STRIDE_POINTS = 50000     # stride-slice down to about this many points
+PLOT_LTTB_POINTS = 500         # points actually handed to matplotlib
+PLOT_LTTB_MIN = 1000           # below this the data is plotted as is
+
+# Single-producer/single-consumer ring of (current, voltage) rows.
+# read_data only writes plot_buf and advances plot_head; update_graph only
+# reads rows below its snapshot of plot_head and advances plot_tail.
+plot_buf = np.empty((PLOT_POINTS, 2), dtype=np.float32)
+plot_head = 0
+plot_tail = 0
 
 
 # ---------------- Tkinter GUI ---------------- #
@@ -67,19 +95,25 @@ exit_button.grid(row=2, column=3)
 
 # ---------------- Keithley Script ---------------- #
 def write_script_to_Keithley():
-    global inst
-    rm = pyvisa.ResourceManager()
+    """Upload and start QD.tsp; returns False if the DMM is not reachable."""
+    global inst, rm
+    if rm is None:
+        rm = pyvisa.ResourceManager()
     
     try:
         inst = rm.open_resource(f"TCPIP0::{IP_DMM_var.get()}::inst0::INSTR")
+        inst.chunk_size = VISA_CHUNK_SIZE
+        inst.timeout = VISA_TIMEOUT
     except Exception as e:
         messagebox.showinfo("Error", f"Could not connect to Keithley:\n{e}")
-        return
+        return False
 
     with open("QD.tsp", "r") as f:
         script_content = f.read()
 
     script_content = script_content.replace("TRESHOLD", str(float(treshold_var.get()) / 1000))
+    script_content = script_content.replace("RAMPRATE", str(ramprate))
+    script_content = script_content.replace("BATCH", str(DMM_BATCH))
     
     inst.write("abort")
     inst.write('script.delete("QD")')
@@ -88,16 +122,24 @@ def write_script_to_Keithley():
     inst.write("endscript")
     inst.write("QD.save()")
     inst.write("QD.run()")
+    return True
 
 
 # ---------------- File Handling ---------------- #
 def open_file():
     os.makedirs("data", exist_ok=True)
     
+    # O_EXCL: create the file only if it does not exist yet, in one call
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    
     while True:
         filename = f"data\\{filename_entry.get()}.csv"
-        if not os.path.exists(filename):
-            return open(filename, "w", newline="")
+        try:
+            fd = os.open(filename, flags, 0o644)
+        except FileExistsError:
+            pass
+        else:
+            return os.fdopen(fd, "wb", buffering=CSV_BUFFER_SIZE)
         
         filename_entry.delete(0, tk.END)
         filename_entry.insert(0, datetime.datetime.now().strftime("%m%d%Y_%H%M%S"))
@@ -105,39 +147,48 @@ def open_file():
 
 # ---------------- Measurement Start ---------------- #
 def start_measurement():
-    global measurement_running, file, csv_writer, thread_readdata
-    global times, currents, voltages
-    measurement_running = True
+    global file, thread_readdata, thread_writedata, psu
+    global row_queue
+    global plot_head, plot_tail, ramprate
+    # Parse the inputs first: a bad entry must fail before anything is started
+    ramprate = float(ramprate_var.get())
+    imax = float(maxcurrent_var.get())
+    t_ramp = imax / ramprate
+    steps = [
+        (0, 1.0),
+        (0, 1.0),
+        (imax, t_ramp),
+        (imax, 1.0),
+        (0, t_ramp),
+        (0, 1.0),
+    ]
 
-    times.clear()
-    currents.clear()
-    voltages.clear()
+    # one control connection for program, trigger and abort
+    psu = PSU.PSU(IP_PSU_var.get(), PORT)
 
-    write_script_to_Keithley()
+    stop_event.clear()
+    plot_head = plot_tail = 0
+    row_queue = queue.SimpleQueue()
+
+    # without the DMM there is no quench detection: do not ramp the PSU
+    if not write_script_to_Keithley():
+        stop_event.set()
+        return
     time.sleep(1)
 
     file = open_file()
-    csv_writer = csv.writer(file)
-    csv_writer.writerow(["timestamp", "current(A)", "voltage(V)"])
+    file.write(b"timestamp,current(A),voltage(V)\n")
 
     start_button.config(state=tk.DISABLED)
     stop_button.config(state=tk.NORMAL)
 
+    thread_writedata = threading.Thread(target=write_data, daemon=True)
+    thread_writedata.start()
+
     thread_readdata = threading.Thread(target=read_data, daemon=True)
     thread_readdata.start()
 
-    steps = [
-        (0, 1.0),
-        (0, 1.0),
-        (float(maxcurrent_var.get()), float(maxcurrent_var.get()) / float(ramprate_var.get())),
-        (float(maxcurrent_var.get()), 1.0),
-        (0, float(maxcurrent_var.get()) / float(ramprate_var.get())),
-        (0, 1.0),
-    ]
-
-    PSU.program_current_wave_sequence(
-        ip=IP_PSU_var.get(),
-        port=PORT,
+    psu.program(
         steps=steps,
         i_start=0.0,
         counter=1,
@@ -147,97 +198,195 @@ def start_measurement():
     )
 
     start_graph()
-    PSU.trigger_PSU()
+    psu.trigger()
+
+
+# ---------------- Plot Downsampling ---------------- #
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: indices of n_out points of (x, y)
+    that keep the visual shape (peaks, envelope) of the full curve."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    idx = np.empty(n_out, dtype=np.intp)
+    idx[0], idx[-1] = 0, n - 1
+    # n_out - 2 buckets between the fixed first and last point
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+
+    a = 0
+    for k in range(n_out - 2):
+        lo, hi = edges[k], edges[k + 1]
+        if k + 2 < len(edges):
+            nx = x[hi:edges[k + 2]].mean()
+            ny = y[hi:edges[k + 2]].mean()
+        else:
+            nx, ny = x[-1], y[-1]
+
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - nx) * (by - y[a]) - (x[a] - bx) * (ny - y[a]))
+        a = lo + int(area.argmax())
+        idx[k + 1] = a
+
+    return idx
 
 
 # ---------------- Live Graph ---------------- #
 def start_graph():
-    global fig, ax, canvas, line
+    global fig, ax, canvas, line, ani
     fig, ax = plt.subplots()
     line, = ax.plot([], [], marker="o", linestyle="-")
+    ax.set_xlabel("Current (A)")
+    ax.set_ylabel("Voltage (V)")
+    ax.set_title("DMM7510 Live Measurement")
     
     canvas = FigureCanvasTkAgg(fig, master=root)
     canvas.get_tk_widget().grid(row=3, column=0, columnspan=6)
-    
-    update_graph()
 
-
-def update_graph():
-    if currents:
-        line.set_xdata(currents)
-        line.set_ydata(voltages)
+    # blit: per frame only the line is redrawn over the cached axes background
+    ani = animation.FuncAnimation(fig, update_graph, init_func=lambda: (line,),
+                                  interval=200, blit=True,  # 5 Hz
+                                  cache_frame_data=False)
+    canvas.draw()
+
+
+def update_graph(frame):
+    global plot_tail
+    head = plot_head  # snapshot, rows below head are complete
+    if head != plot_tail:
+        n = min(head, PLOT_POINTS)
+        stride = max(1, n // PLOT_STRIDE_POINTS)
+        x, y = plot_buf[:n:stride, 0], plot_buf[:n:stride, 1]
+        if len(x) >= PLOT_LTTB_MIN:
+            idx = lttb_indices(x, y, PLOT_LTTB_POINTS)
+            x, y = x[idx], y[idx]
+        line.set_data(x, y)
+
+        limits = ax.get_xlim(), ax.get_ylim()
         ax.relim()
         ax.autoscale_view()
-        ax.set_xlabel("Current (A)")
-        ax.set_ylabel("Voltage (V)")
-        ax.set_title("DMM7510 Live Measurement")
-        canvas.draw()
+        if (ax.get_xlim(), ax.get_ylim()) != limits:
+            canvas.draw()  # new ticks, the animation then caches this background
+        plot_tail = head
+
+    if stop_event.is_set():
+        ani.event_source.stop()
 
-    if measurement_running:
-        root.after(200, update_graph)  # 5 Hz
+    return line,
 
 
 # ---------------- Data Collection ---------------- #
 def read_data():
-    i = 0
-    qd = 0
-    qd_time = 0
+    deadline = None  # monotonic ns at which to stop, set on QD
     error = 0
-    global measurement_running
-
-    while measurement_running:
+    global plot_head
+
+    # Loop invariants as locals, the loop body runs for every sample
+    read_raw = inst.read_raw
+    iter_rows = DMM_ROW.iter_unpack
+    row_size = DMM_ROW.size
+    put = row_queue.put
+    buf = plot_buf
+    head = plot_head
+    now_ns = time.monotonic_ns
+    stopped = stop_event.is_set
+
+    while not stopped():
         try:
-            data = inst.read().strip()
-            
-            if data == "QD":
-                qd = 1
-                qd_time = time.time()
-                continue
+            # "#0" + (time, current, value) rows as REAL32 + "\n",
+            # see printbuffer in QD.tsp. One read returns the whole block of
+            # DMM_BATCH samples. Do not read with break_on_termchar, the
+            # REAL32 payload can contain 0x0A bytes.
+            raw = read_raw(VISA_CHUNK_SIZE)
+            rows = memoryview(raw)[2:2 + (len(raw) - 2) // row_size * row_size]
 
-            t_str, v_str = data.split(",")
-            a_str = 0 if qd else round((float(t_str) - 1) * float(ramprate_var.get()), 3)
+            for t, a, v in iter_rows(rows):
+                if t < 0:  # QD marker, current is already 0 from here on
+                    if deadline is None:
+                        deadline = now_ns() + 1_000_000_000  # keep logging 1 s
+                    continue
 
-            csv_writer.writerow([t_str, a_str, v_str])
-            file.flush()
+                put((t, a, v))
+
+                buf[head % PLOT_POINTS] = a, v
+                head += 1
+                plot_head = head  # publish the row after it is written
 
-            i += 1
-            if i % 15 == 0:
-                currents.append(a_str)
-                voltages.append(float(v_str))
-                i = 0
+            error = 0  # only consecutive failures abort the measurement
 
-            if qd and time.time() > qd_time + 1:
-                measurement_running = False
+            if deadline is not None and now_ns() > deadline:
+                stop_event.set()
 
         except Exception as e:
             error += 1
             if error > 30:
                 print("exception at data collection:", error)
                 stop_measurement()
+            time.sleep(0.05)
 
-        time.sleep(0.01)  # 100 Hz
+        # No sleep here: the VISA read blocks until the DMM sends data
+
+
+def write_data():
+    """Drain row_queue into the CSV file in batches until a None arrives."""
+    get = row_queue.get
+    write = file.write
+    flush = file.flush
+    running = True
+
+    while running:
+        rows = []
+        try:
+            while len(rows) < CSV_BATCH_ROWS:
+                # block for the first row, then only briefly to fill the batch
+                row = get(timeout=CSV_QUEUE_TIMEOUT) if rows else get()
+                if row is None:
+                    running = False
+                    break
+                rows.append(row)
+        except queue.Empty:
+            pass
+        write(b"".join([CSV_ROW % row for row in rows]))
+        flush()  # one flush per batch, so a crash loses at most one batch
 
 
 # ---------------- Stop ---------------- #
 def stop_measurement():
-    global measurement_running, thread_readdata
-    measurement_running = False
+    global thread_readdata, thread_writedata
+    stop_event.set()
 
     start_button.config(state=tk.ACTIVE)
     stop_button.config(state=tk.DISABLED)
 
-    PSU.abort_PSU()
+    abort_error = None
+    try:
+        if psu is not None:
+            psu.abort()
+    except Exception as e:
+        abort_error = e
+    finally:
+        if psu is not None:
+            psu.close()
+
+        # read_data itself calls stop_measurement after repeated errors
+        if threading.current_thread() is not thread_readdata:
+            thread_readdata.join(timeout=1.0)
 
-    if thread_readdata.is_alive():
-        thread_readdata.join()
+        row_queue.put(None)  # no more rows, let write_data finish the file
+        thread_writedata.join()
 
-    try: file.close()
-    except: pass
+        try:
+            file.flush()
+            file.close()
+        except: pass
 
-    try: inst.close()
-    except: pass
+        try: inst.close()
+        except: pass
 
-    messagebox.showinfo("Stopped", "Measurement finished. File saved.")
+    if abort_error is not None:
+        messagebox.showerror("Error", f"PSU abort failed, switch the PSU off manually:\n{abort_error}")
+    else:
+        messagebox.showinfo("Stopped", "Measurement finished. File saved.")
 
 
 def exit_app():
@@ -9,44 +9,219 @@ Genesys+ GSP10-1000:
 Communication: SCPI over TCP/IP (port 8003).
 """
 
+import re
 import socket
 import time
-import csv
 import threading
-from datetime import datetime
+import queue
 from typing import Iterable, List, Tuple, Union
 
+import numpy as np
+
 IP = "169.254.249.195"   # <-- set your PSU IP here
 PORT = 8003
 SOCKET_TIMEOUT = 5.0   # seconds
+KEEPALIVE_IDLE = 30    # seconds idle before keepalive probes on the control socket
+RECV_SIZE = 8192       # bytes, reusable receive chunk per connection
+LOG_BUFFER_SIZE = 1 << 20  # bytes, write buffer of the monitoring CSV
+LOG_QUEUE_SIZE = 1024      # samples the log writer thread may fall behind
 
 # Status bits in STAT:OPER:COND?
 SSA_BIT = 6   # Sequencer Step Active
 TWI_BIT = 3   # Trigger Wait
+ARM_TIMEOUT = 2.0       # s, max wait for TWI after INIT
+ARM_POLL_PERIOD = 0.01  # s between STAT:OPER:COND? polls while arming
+
+# One compound query per monitoring sample, answered as "V;I;P;STAT".
+# Pre-encoded, it is sent unchanged at every sample.
+MONITOR_QUERY = b"MEAS:VOLT?;:MEAS:CURR?;:MEAS:POW?;:STAT:OPER:COND?\n"
+# time_iso, t_rel_s, volt_V, curr_A, pow_W, TWI, SSA, status_raw
+MONITOR_ROW = b"%s,%.6f,%.9g,%.9g,%.9g,%d,%d,%d\n"
+
+
+# Error entries in a SYST:ERR:ALL? reply, e.g. '-222,"Data out of range"'
+_ERROR_ENTRY = re.compile(r'(-?\d+),"([^"]*)"')
+_err_all_supported = True  # cleared once the PSU rejects SYST:ERR:ALL?
 
 
 # ---------- Low-level SCPI helpers ----------
 
-def scpi_write(sock: socket.socket, cmd: str) -> None:
+def _configure_socket(
+    sock: socket.socket,
+    rcvbuf: int | None = None,
+    sndbuf: int | None = None,
+    keepalive: bool = False,
+) -> None:
+    """Disable Nagle so each short SCPI command is sent immediately.
+
+    rcvbuf/sndbuf: kernel socket buffer sizes in bytes (e.g. 262144/65536)
+      to absorb bursts of replies during fast polling. None leaves the
+      OS autotuning alone, which is usually the better choice.
+    keepalive: enable TCP keepalive (idle KEEPALIVE_IDLE s) so a dropped
+      long-lived connection is detected
+    """
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    if keepalive:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, KEEPALIVE_IDLE)
+    if rcvbuf is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, int(rcvbuf))
+    if sndbuf is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, int(sndbuf))
+    if rcvbuf is not None or sndbuf is not None:
+        print(
+            f"Socket buffers: SO_RCVBUF={sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)}, "
+            f"SO_SNDBUF={sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)}"
+        )
+
+
+def _quickack(sock: socket.socket) -> None:
+    """Suppress the delayed ACK for the next reply (Linux only, no-op elsewhere)."""
+    if hasattr(socket, "TCP_QUICKACK"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+
+
+class SCPIConnection:
+    """SCPI socket with a persistent receive buffer for LF-terminated replies.
+
+    Bytes after the first LF are kept for the next readline(), so several
+    responses can be read from one recv.
+    """
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self._rbuf = bytearray()
+        self._chunk = bytearray(RECV_SIZE)
+        self._view = memoryview(self._chunk)
+
+    def __enter__(self) -> "SCPIConnection":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.sock.close()
+
+    def sendall(self, data: bytes) -> None:
+        self.sock.sendall(data)
+
+    def readline(self) -> bytes:
+        """Return the next response line as raw bytes, without its LF.
+
+        float() and int() accept bytes directly, so numeric replies need
+        no decode/strip.
+        """
+        rbuf = self._rbuf
+        end = rbuf.find(b"\n")
+        if end >= 0:  # already buffered (pipelined replies)
+            line = bytes(rbuf[:end])
+            del rbuf[:end + 1]
+            return line
+
+        view = self._view
+        while True:
+            n = self.sock.recv_into(view)
+            if not n:
+                raise RuntimeError("Socket closed while waiting for a response")
+            end = self._chunk.find(b"\n", 0, n)
+            if end >= 0:
+                break
+            rbuf += view[:n]
+
+        # Common case: the whole reply came in one recv, copy it out once.
+        if rbuf:
+            rbuf += view[:end]
+            line = bytes(rbuf)
+            rbuf.clear()
+        else:
+            line = view[:end].tobytes()
+        rbuf += view[end + 1:n]  # keep bytes of following replies
+        return line
+
+
+def scpi_connect(
+    ip: str,
+    port: int,
+    rcvbuf: int | None = None,
+    sndbuf: int | None = None,
+    keepalive: bool = False,
+) -> SCPIConnection:
+    """Open a TCP connection to the PSU, ready for scpi_write/scpi_query."""
+    # Buffer sizes only affect the TCP window if set before connect() (tcp(7)),
+    # so build the socket by hand instead of using socket.create_connection.
+    err = None
+    for family, type_, proto, _, addr in socket.getaddrinfo(ip, port, 0, socket.SOCK_STREAM):
+        sock = socket.socket(family, type_, proto)
+        try:
+            _configure_socket(sock, rcvbuf, sndbuf, keepalive)
+            sock.settimeout(SOCKET_TIMEOUT)
+            sock.connect(addr)
+            return SCPIConnection(sock)
+        except OSError as e:
+            sock.close()
+            err = e
+    raise err if err is not None else OSError(f"getaddrinfo returned nothing for {ip}:{port}")
+
+
+def scpi_write(sock: SCPIConnection, cmd: str) -> None:
     """Send a SCPI command (no response expected)."""
     msg = (cmd + "\n").encode("ascii")
     sock.sendall(msg)
 
 
-def scpi_query(sock: socket.socket, cmd: str) -> str:
+def scpi_write_bytes(sock: SCPIConnection, msg: bytes) -> None:
+    """Send a pre-encoded, LF-terminated SCPI message."""
+    sock.sendall(msg)
+
+
+def scpi_write_many(sock: SCPIConnection, cmds: Iterable[str]) -> None:
+    """Send several SCPI commands (no responses) in a single sendall.
+
+    A SCPI list command such as PROG:WAVE:CURR cannot be continued in a
+    second command, so long lists go out as one message and TCP splits
+    it into segments.
+    """
+    # join with a trailing "" for the final LF: one str, one encode, no concat
+    msg = "\n".join([*cmds, ""]).encode("ascii")
+    sock.sendall(msg)
+
+
+def scpi_read(sock: SCPIConnection) -> str:
+    """Read one LF-terminated response line (for a query sent earlier)."""
+    return sock.readline().decode("ascii").strip()
+
+
+def scpi_query(sock: SCPIConnection, cmd: str) -> str:
     """Send a SCPI query and read one LF-terminated response line."""
     scpi_write(sock, cmd)
-    data = b""
-    while not data.endswith(b"\n"):
-        chunk = sock.recv(4096)
-        if not chunk:
-            raise RuntimeError(f"Socket closed while waiting for response to {cmd!r}")
-        data += chunk
-    return data.decode("ascii").strip()
+    return scpi_read(sock)
+
 
+def check_error_queue(sock: SCPIConnection) -> None:
+    """Drain the error queue and print any errors.
 
-def check_error_queue(sock: socket.socket) -> None:
-    """Poll SYST:ERR? until it returns '0,...'. Print any errors."""
+    Uses one SYST:ERR:ALL? round trip; falls back to polling SYST:ERR?
+    until '0,...' if the PSU does not know the bulk query.
+    """
+    global _err_all_supported
+    probe_error = False
+    if _err_all_supported:
+        # *OPC? always answers "1": if that is the first line back, the PSU
+        # ignored SYST:ERR:ALL? and queued a -113 for it, without any timeout.
+        scpi_write_many(sock, ["SYST:ERR:ALL?", "*OPC?"])
+        resp = scpi_read(sock)
+        if resp != "1":
+            for code, msg in _ERROR_ENTRY.findall(resp):
+                if int(code) != 0:
+                    print(f'PSU error: {code},"{msg}"')
+            scpi_read(sock)  # *OPC? sentinel
+            return
+        _err_all_supported = False
+        probe_error = True
+
+    errors = []
     while True:
         err = scpi_query(sock, "SYST:ERR?")
         code_str = err.split(",", 1)[0]
@@ -57,12 +232,18 @@ def check_error_queue(sock: socket.socket) -> None:
             break
         if code == 0:
             break
+        errors.append(err)
+    # the probe's own -113 is the newest entry in the queue
+    if probe_error and errors and errors[-1].startswith("-113,"):
+        errors.pop()
+    for err in errors:
         print("PSU error:", err)
 
 
-def stat_oper_cond(sock: socket.socket) -> int:
+def stat_oper_cond(sock: SCPIConnection) -> int:
     """Read STAT:OPER:COND? and return it as an integer."""
-    return int(scpi_query(sock, "STAT:OPER:COND?"))
+    scpi_write(sock, "STAT:OPER:COND?")
+    return int(sock.readline())
 
 
 def bit(val: int, n: int) -> int:
@@ -85,10 +266,11 @@ def program_current_wave_sequence(
     trigger_delay: float = 0.0,
     continuous_init: bool = False,
     store_cell: int | None = None,       # e.g. 1..4 or None to skip storing
+    settling_time: float = 0.0,
 ) -> None:
     """Program a WAVE-mode current sequence and arm it with BUS trigger selected.
 
-    steps: sequence of (I_target [A], T_ramp [s], T_dwell [s])
+    steps: sequence of (I_target [A], T_ramp [s])
     i_start: initial current (A) before first step
     counter: number of iterations (1..9999) or 'INF'
     trigger_delay: seconds between *TRG and waveform start
@@ -96,90 +278,180 @@ def program_current_wave_sequence(
       - False: one sequence per INIT (you must re-INIT each time)
       - True: PSU re-arms automatically after each sequence
     store_cell: if not None, store sequence into non-volatile memory cell (1..4)
+    settling_time: optional extra wait (s) after programming; the PSU is
+      already synchronized with *OPC?, so 0 is normally enough
 
     Sequence is not started here; you must later send *TRG while TRIG:SOUR BUS.
     """
-    curr_points = [step[0] for step in steps]
-    time_points = [step[1] for step in steps]
-    print(curr_points)
-    print(time_points)
-
-    with socket.create_connection((ip, port), timeout=SOCKET_TIMEOUT) as sock:
+    steps_arr = _wave_points(steps)  # reject bad steps before connecting
+    with scpi_connect(ip, port) as sock:
         print("Connected to PSU for programming.")
-        scpi_write(sock, "SYST:LANG SCPI")
-        scpi_write(sock, "*CLS")
-        scpi_write(sock, "OUTPut:TTLTrg:MODE OFF")
-        scpi_write(sock, "ABOR")  # Abort any running sequence
-        scpi_write(sock, "CURR:LEV 0")
-        # --- Program the WAVE sequence in current ---
+        _program_wave_sequence(
+            sock, steps_arr, i_start, counter, trigger_delay,
+            continuous_init, store_cell, settling_time,
+        )
 
-        scpi_write(sock, "SOUR:CURR:MODE WAVE")
 
-        wave_curr_str = ",".join(f"{v:.6g}" for v in curr_points)
-        scpi_write(sock, f"PROG:WAVE:CURR {wave_curr_str}")
+def _wave_points(steps: Iterable[Step]) -> np.ndarray:
+    """Validate steps and return them as an (N, 2) array of (I_target, T_ramp)."""
+    steps_arr = np.asarray(list(steps), dtype=np.float64)
+    if steps_arr.ndim != 2 or steps_arr.shape[1] != 2 or len(steps_arr) == 0:
+        raise ValueError(f"steps must be a non-empty sequence of (I_target, T_ramp), got shape {steps_arr.shape}")
+    return steps_arr
 
-        wave_time_str = ",".join(f"{t:.6g}" for t in time_points)
-        scpi_write(sock, f"PROG:WAVE:TIME {wave_time_str}")
 
-        time.sleep(0.2)  # allow processing
+def _program_wave_sequence(
+    sock: SCPIConnection,
+    steps_arr: np.ndarray,
+    i_start: float = 0.0,
+    counter: Union[int, str] = 1,
+    trigger_delay: float = 0.0,
+    continuous_init: bool = False,
+    store_cell: int | None = None,
+    settling_time: float = 0.0,
+) -> None:
+    """Body of program_current_wave_sequence on an already open connection.
 
-        scpi_write(sock, "PROG:STEP AUTO")
+    steps_arr: output of _wave_points
+    """
+    curr_points = steps_arr[:, 0]
+    time_points = steps_arr[:, 1]
+
+    wave_curr_str = ",".join(map("{:.6g}".format, curr_points))
+    wave_time_str = ",".join(map("{:.6g}".format, time_points))
+    scpi_write_many(sock, [
+        "SYST:LANG SCPI",
+        "*CLS",
+        "OUTPut:TTLTrg:MODE OFF",
+        "ABOR",  # Abort any running sequence
+        "CURR:LEV 0",
+        # --- Program the WAVE sequence in current ---
+        "SOUR:CURR:MODE WAVE",
+        f"PROG:WAVE:CURR {wave_curr_str}",
+        f"PROG:WAVE:TIME {wave_time_str}",
+    ])
 
-        if isinstance(counter, str) and counter.upper().startswith("INF"):
-            scpi_write(sock, "PROG:COUN INF")
-        else:
-            scpi_write(sock, f"PROG:COUN {int(counter)}")
+    scpi_query(sock, "*OPC?")  # wait until the wave lists are processed
 
-        if store_cell is not None:
-            scpi_write(sock, f"PROG:STOR {int(store_cell)}")
-            time.sleep(0.2)
+    if isinstance(counter, str) and counter.upper().startswith("INF"):
+        coun = "PROG:COUN INF"
+    else:
+        coun = f"PROG:COUN {int(counter)}"
+    scpi_write_many(sock, ["PROG:STEP AUTO", coun])
 
-        # --- Trigger configuration: BUS + INIT ---
+    if store_cell is not None:
+        scpi_write(sock, f"PROG:STOR {int(store_cell)}")
+        scpi_query(sock, "*OPC?")  # returns once the cell is written
 
-        scpi_write(sock, "TRIG:SOUR BUS")
-        scpi_write(sock, f"TRIG:DEL {float(trigger_delay):.6g}")
-        scpi_write(sock, f"INIT:CONT {'ON' if continuous_init else 'OFF'}")
+    # --- Trigger configuration: BUS + INIT ---
 
+    scpi_write_many(sock, [
+        "TRIG:SOUR BUS",
+        f"TRIG:DEL {float(trigger_delay):.6g}",
+        f"INIT:CONT {'ON' if continuous_init else 'OFF'}",
         # Turn output ON so the sequence drives the load when triggered.
-        scpi_write(sock, "OUTP ON")
+        "OUTP ON",
+    ])
+    scpi_query(sock, "*OPC?")  # wait until the trigger setup is applied
 
-        # INIT arms the trigger system; *TRG will actually start the sequence.
-        scpi_write(sock, "INIT")
-
-        time.sleep(0.2)
-        
-        scpi_write(sock, "OUTPut:TTLTrg:MODE FSTR")
+    # INIT arms the trigger system; *TRG will actually start the sequence.
+    # INIT is overlapped: *OPC? would only answer after *TRG and the whole
+    # sequence, so confirm arming by polling for Trigger Wait instead.
+    scpi_write_many(sock, ["INIT", "OUTPut:TTLTrg:MODE FSTR"])
 
+    deadline = time.monotonic() + ARM_TIMEOUT
+    while True:
         status = stat_oper_cond(sock)
         twi = bit(status, TWI_BIT)
-        ssa = bit(status, SSA_BIT)
-        print(
-            f"STAT:OPER:COND? = {status} (TWI={twi}, SSA={ssa}) "
-            f"=> {'waiting for BUS trigger' if twi else 'not in trigger-wait'}"
-        )
+        if twi or time.monotonic() > deadline:
+            break
+        time.sleep(ARM_POLL_PERIOD)
+    ssa = bit(status, SSA_BIT)
+    print(
+        f"STAT:OPER:COND? = {status} (TWI={twi}, SSA={ssa}) "
+        f"=> {'waiting for BUS trigger' if twi else 'not in trigger-wait'}"
+    )
 
-        check_error_queue(sock)
-        print("Programming done, BUS trigger selected and system INITed (armed).")
-        time.sleep(1)
+    check_error_queue(sock)
+    print("Programming done, BUS trigger selected and system INITed (armed).")
+    if settling_time > 0:
+        time.sleep(settling_time)
 
-        # scpi_write(sock, "*TRG")
-        # print("*TRG sent (BUS trigger). Sequence should now start.")
+    # scpi_write(sock, "*TRG")
+    # print("*TRG sent (BUS trigger). Sequence should now start.")
 
 
-def trigger_PSU():
-    with socket.create_connection((IP, PORT), timeout=SOCKET_TIMEOUT) as s:
-        scpi_write(s, "SYST:LANG SCPI")
-        scpi_write(s, "*TRG")
+class PSU:
+    """Persistent control connection for program / trigger / abort.
+
+    One socket (with TCP keepalive) is opened on first use and reused, so
+    trigger() and abort() do not pay for a new TCP handshake. Monitoring
+    keeps its own connection, see monitor_and_log.
+
+        with PSU(ip, port) as psu:
+            psu.program(steps)
+            psu.trigger()
+    """
+
+    def __init__(self, ip: str = IP, port: int = PORT) -> None:
+        self.ip = ip
+        self.port = port
+        self.conn: SCPIConnection | None = None
+
+    def __enter__(self) -> "PSU":
+        return self.open()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def open(self) -> "PSU":
+        if self.conn is None:
+            self.conn = scpi_connect(self.ip, self.port, keepalive=True)
+            print("Connected to PSU for control.")
+        return self
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def program(self, steps: Iterable[Step], **kwargs) -> None:
+        """Program and arm a WAVE sequence, see program_current_wave_sequence."""
+        steps_arr = _wave_points(steps)  # reject bad steps before connecting
+        _program_wave_sequence(self.open().conn, steps_arr, **kwargs)
+
+    def trigger(self) -> None:
+        scpi_write_many(self.open().conn, ["SYST:LANG SCPI", "*TRG"])
         print("*TRG sent (BUS trigger). Sequence should now start.")
 
-def abort_PSU():
-    with socket.create_connection((IP, PORT), timeout=SOCKET_TIMEOUT) as s:
-        scpi_write(s, "ABOR")
-        scpi_write(s, "OUTP OFF")
-        scpi_write(s, "*TRG")
+    def abort(self) -> None:
+        """Abort the sequence and switch the output off.
+
+        Completion is confirmed with *OPC?. A send on a connection the PSU
+        has already dropped can still succeed locally, so on any failure
+        (no reply, timeout, socket error) the commands are sent again on a
+        fresh connection.
+        """
+        cmds = ["ABOR", "OUTP OFF", "*TRG"]
+        try:
+            scpi_write_many(self.open().conn, cmds)
+            scpi_query(self.conn, "*OPC?")
+        except (OSError, RuntimeError):
+            self.close()
+            scpi_write_many(self.open().conn, cmds)
+            scpi_query(self.conn, "*OPC?")
         print("Abort any running sequence and stop the current.")
 
 
+def trigger_PSU():
+    with PSU() as psu:
+        psu.trigger()
+
+def abort_PSU():
+    with PSU() as psu:
+        psu.abort()
+
+
 # ---------- Monitoring & logging ----------
 
 def monitor_and_log(
@@ -189,6 +461,8 @@ def monitor_and_log(
     sample_hz: float = 20.0,
     stop_when_done: bool = True,
     max_seconds: float | None = None,
+    rcvbuf: int | None = None,
+    sndbuf: int | None = None,
 ) -> str:
     """Poll MEAS:VOLT?, MEAS:CURR?, MEAS:POW? and STAT:OPER:COND? at sample_hz.
 
@@ -199,62 +473,114 @@ def monitor_and_log(
       - SSA has been 1 at least once AND is now 0 again (sequence finished),
       - OR max_seconds elapsed (if given),
       - OR stop_when_done is False and max_seconds is None (manual termination).
+
+    rcvbuf/sndbuf: optional socket buffer sizes in bytes (e.g. 262144/65536)
+      for high sample_hz; None keeps the OS autotuning.
     """
     period = 1.0 / float(sample_hz)
     started = None
     saw_active = False
 
-    with socket.create_connection((ip, port), timeout=SOCKET_TIMEOUT) as s, \
-         open(csv_path, "w", newline="") as f:
+    with scpi_connect(ip, port, rcvbuf, sndbuf) as s, \
+         open(csv_path, "wb", buffering=LOG_BUFFER_SIZE) as f:
 
         print("Connected to PSU for monitoring.")
         scpi_write(s, "SYST:LANG SCPI")
 
-        writer = csv.writer(f)
-        writer.writerow([
-            "time_iso", "t_rel_s",
-            "volt_V", "curr_A", "pow_W",
-            "TWI", "SSA", "status_raw",
-        ])
+        write = f.write
+        write(b"time_iso,t_rel_s,volt_V,curr_A,pow_W,TWI,SSA,status_raw\n")
+
+        # Formatting and disk writes run in their own thread, so a slow
+        # filesystem cannot delay the next poll. Bounded for backpressure.
+        samples: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        writer_error: List[BaseException] = []  # set if log_writer dies
+
+        def log_writer() -> None:
+            try:
+                while True:
+                    sample = samples.get()
+                    if sample is None:
+                        break
+                    now, *values = sample
+                    # ISO UTC timestamp from the same clock read, no datetime object
+                    time_iso = (time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(now))
+                                + f".{int((now % 1) * 1000):03d}Z").encode("ascii")
+                    write(MONITOR_ROW % (time_iso, *values))
+            except BaseException as e:
+                writer_error.append(e)
+
+        def put_sample(item) -> None:
+            """Queue item for log_writer; never block on a dead writer."""
+            while True:
+                if writer_error or not writer.is_alive():
+                    raise RuntimeError("Log writer stopped") from (
+                        writer_error[0] if writer_error else None)
+                try:
+                    samples.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    pass
+
+        writer = threading.Thread(target=log_writer, daemon=True)
+        writer.start()
 
-        t0 = time.time()
-        while True:
-            loop_start = time.time()
-
-            v = float(scpi_query(s, "MEAS:VOLT?"))
-            i = float(scpi_query(s, "MEAS:CURR?"))
-            p = float(scpi_query(s, "MEAS:POW?"))
-            status = stat_oper_cond(s)
-
-            now = time.time()
-            if started is None:
-                started = now
-            t_rel = now - started
-
-            twi = bit(status, TWI_BIT)
-            ssa = bit(status, SSA_BIT)
-            if ssa:
-                saw_active = True
-
-            writer.writerow([
-                datetime.utcnow().isoformat(timespec="milliseconds") + "Z",
-                f"{t_rel:.6f}",
-                f"{v:.9g}", f"{i:.9g}", f"{p:.9g}",
-                int(twi), int(ssa), status,
-            ])
-
-            if max_seconds is not None and (now - t0) >= max_seconds:
-                print("Logging stopped due to timeout.")
-                break
-
-            if stop_when_done and saw_active and not ssa:
-                print("Logging stopped: sequence finished (SSA transitioned 1->0).")
-                break
-
-            dt = time.time() - loop_start
-            sleep_left = period - dt
-            if sleep_left > 0:
-                time.sleep(sleep_left)
+        try:
+            t0 = time.monotonic()
+            wall_offset = time.time() - t0  # wall clock = monotonic + offset
+            next_tick = t0 + period  # absolute deadlines, so overshoot does not drift
+            while True:
+                scpi_write_bytes(s, MONITOR_QUERY)
+                v_s, i_s, p_s, st_s = s.readline().split(b";")
+                v = float(v_s)
+                i = float(i_s)
+                p = float(p_s)
+                status = int(st_s)
+                _quickack(s.sock)  # Linux clears QUICKACK again, so re-arm every sample
+
+                mono = time.monotonic()   # the only clock read per sample
+                now = mono + wall_offset  # wall clock, only for time_iso
+                if started is None:
+                    started = mono
+                t_rel = mono - started
+
+                twi = bit(status, TWI_BIT)
+                ssa = bit(status, SSA_BIT)
+                saw_active = saw_active or ssa
+
+                sample = (now, t_rel, v, i, p, twi, ssa, status)
+                if writer_error:
+                    put_sample(sample)  # raises the writer's error
+                try:
+                    samples.put_nowait(sample)
+                except queue.Full:
+                    print("Log writer is falling behind, waiting for the disk.")
+                    put_sample(sample)
+
+                if max_seconds is not None and (mono - t0) >= max_seconds:
+                    print("Logging stopped due to timeout.")
+                    break
+
+                if stop_when_done and saw_active and not ssa:
+                    print("Logging stopped: sequence finished (SSA transitioned 1->0).")
+                    break
+
+                sleep_left = next_tick - mono
+                if sleep_left > 0:
+                    time.sleep(sleep_left)
+                elif sleep_left < -period:
+                    next_tick = mono  # fell behind, skip missed ticks
+                next_tick += period
+        finally:
+            # writer drains the queue, then the file closes
+            if not writer_error and writer.is_alive():
+                try:
+                    put_sample(None)
+                except RuntimeError:
+                    pass  # writer died meanwhile, its error is raised below
+            writer.join()
+
+        if writer_error:
+            raise RuntimeError("Log writer stopped") from writer_error[0]
 
     print(f"Log saved to {csv_path}")
     return csv_path
@@ -264,7 +590,7 @@ def monitor_and_log(
 def main() -> None:
     # Define your sequence here:
     # Each tuple is (I_target [A], ramp_time [s])
-    stepss: List[Step] = [
+    steps: List[Step] = [
         (0, 1),
         (0, 1),
         (500, 25),
@@ -1,21 +1,19 @@
-import csv
+import numpy as np
 import matplotlib.pyplot as plt
 
-# --- Read CSV ---
-times = []
-voltages = []
+MARKER_MAX_POINTS = 5000  # above this, drawing markers dominates the plot time
 
-with open("data//P1a_11242025_154547.csv", "r") as file:
-    csv_reader = csv.reader(file)
-    next(csv_reader)  # skip header
-    for row in csv_reader:
-        times.append((float((row)[1])))    # timestamp
-        voltages.append(float(row[2])) # voltage
+# --- Read CSV ---
+# QD_ui log (timestamp, current, voltage): plot voltage over current.
+# Header row skipped; ndmin=2 keeps a single-row file 2-D for the slices below.
+data = np.loadtxt("data//P1a_11242025_154547.csv", delimiter=",", skiprows=1, usecols=(1, 2), ndmin=2)
+currents = data[:, 0]
+voltages = data[:, 1]
 
 # --- Plot Data ---
-plt.plot(times, voltages, marker='o')
-plt.xlabel("Time (s)")
+plt.plot(currents, voltages, marker='o' if len(data) <= MARKER_MAX_POINTS else None)
+plt.xlabel("Current (A)")
 plt.ylabel("Voltage (V)")
 plt.title("DMM7510 Measurement Log")
 plt.grid(True)
-plt.show()
\ No newline at end of file
+plt.show()